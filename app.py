@@ -1,18 +1,23 @@
 import sys
 import os
+import subprocess
+import re
 import json
+import threading
+import atexit
+from dataclasses import dataclass, asdict, replace
+from typing import Optional
 from datetime import datetime, timedelta
-import requests
 from flask import Flask, request, Response, jsonify, send_file, url_for
-from twilio.twiml.voice_response import VoiceResponse, Dial
-import speech_recognition as sr
+from flask.json.provider import DefaultJSONProvider
+from twilio.twiml.voice_response import VoiceResponse, Dial, Gather
 from dotenv import load_dotenv
 
-# Optional: Groq LLM
+# Optional: orjson for faster JSON responses
 try:
-    from groq import Groq
-except:
-    Groq = None
+    import orjson
+except ImportError:
+    orjson = None
 
 # ========================================
 # LOAD ENV
@@ -21,14 +26,8 @@ load_dotenv()
 
 LLM_API_KEY = os.getenv("LLM_API_KEY")
 
-TW_SID = os.getenv("TWILIO_ACCOUNT_SID")
-TW_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-TW_FROM = os.getenv("TWILIO_NUMBER")       # Twilio From Number
-AI_NUMBER = os.getenv("TWILIO_AI_NUMBER")  # AI Twilio Number
-BASE_URL = os.getenv("BASE_URL")           # ngrok URL
-FLASK_BASE = os.getenv("FLASK_BASE", "http://localhost:5000")
-
 STATE_FILE = "state.json"
+STATE_FLUSH_DELAY = 0.5    # seconds; coalesces bursts of writes
 AUDIO_DIR = "/mnt/data"
 
 # ========================================
@@ -36,44 +35,89 @@ AUDIO_DIR = "/mnt/data"
 # ========================================
 app = Flask(__name__)
 
+class OrjsonProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+if orjson:
+    app.json = OrjsonProvider(app)
+
 # ========================================
-# UTIL FUNCTIONS (Shared for backend + UI)
+# UTIL FUNCTIONS
 # ========================================
+# slots=True requires Python 3.10+
+@dataclass(slots=True)
+class ModeState:
+    mode: str = "normal"
+    reason: str = ""
+    active: bool = False
+    expires: Optional[str] = None
+    user_number: Optional[str] = None
+
+# State lives in memory; STATE_FILE is only read once and written lazily
+_state = None
+_state_lock = threading.Lock()
+_flush_timer = None
+
 def load_state():
-    if not os.path.exists(STATE_FILE):
-        data = {
-            "mode": "normal",
-            "reason": "",
-            "active": False,
-            "expires": None,
-            "user_number": None,
-        }
-        save_state(data)
-        return data
-    return json.load(open(STATE_FILE))
+    global _state
+    with _state_lock:
+        if _state is None:
+            if os.path.exists(STATE_FILE):
+                with open(STATE_FILE) as f:
+                    data = json.load(f)
+                # Ignore unknown or legacy keys instead of failing every endpoint
+                _state = ModeState(**{k: v for k, v in data.items()
+                                      if k in ModeState.__dataclass_fields__})
+            else:
+                _state = ModeState()
+        return replace(_state)
 
 def save_state(data):
-    json.dump(data, open(STATE_FILE, "w"))
-
-def is_mode_active():
-    st = load_state()
-    if not st["active"]:
-        return False
-
-    if not st["expires"]:
-        return False
-
-    exp = datetime.fromisoformat(st["expires"])
+    global _state, _flush_timer
+    with _state_lock:
+        _state = replace(data)
+        if _flush_timer:
+            _flush_timer.cancel()
+        _flush_timer = threading.Timer(STATE_FLUSH_DELAY, flush_state)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+def flush_state():
+    with _state_lock:
+        if _state is None:
+            return
+        # Write then rename so a crash never leaves a half-written file
+        tmp = STATE_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(asdict(_state), f)
+        os.replace(tmp, STATE_FILE)
+
+atexit.register(flush_state)
+
+def is_mode_active(st):
+    # Expires the mode in place; returns (active, changed) so callers
+    # only save when something actually changed
+    if not st.active:
+        return False, False
+
+    if not st.expires:
+        st.active = False
+        return False, True
+
+    exp = datetime.fromisoformat(st.expires)
     if datetime.utcnow() > exp:
-        st["active"] = False
-        st["expires"] = None
-        save_state(st)
-        return False
+        st.active = False
+        st.expires = None
+        return False, True
 
-    return True
+    return True, False
 
 # ========================================
-# MODE ENDPOINTS (used by Streamlit UI)
+# MODE ENDPOINTS (used by Streamlit UI in ui.py)
 # ========================================
 @app.route("/set-mode", methods=["POST"])
 def set_mode():
@@ -84,35 +128,48 @@ def set_mode():
     if duration < 1: duration = 1
     if duration > 60: duration = 60
 
-    user_number = data.get("user_number")
-
-    state = {
-        "mode": mode,
-        "reason": reason,
-        "active": True,
-        "expires": (datetime.utcnow() + timedelta(minutes=duration)).isoformat(),
-        "user_number": user_number
-    }
+    # Keep the saved number unless the caller sends the key (even as null)
+    if "user_number" in data:
+        user_number = data["user_number"]
+    else:
+        user_number = load_state().user_number
+
+    state = ModeState(
+        mode=mode,
+        reason=reason,
+        active=True,
+        expires=(datetime.utcnow() + timedelta(minutes=duration)).isoformat(),
+        user_number=user_number,
+    )
     save_state(state)
 
-    return jsonify({"status": "ok", "state": state})
+    return jsonify({"status": "ok", "state": asdict(state)})
+
+@app.route("/set-user-number", methods=["POST"])
+def set_user_number():
+    data = request.get_json()
+    state = load_state()
+    state.user_number = data.get("user_number")
+    save_state(state)
+    return jsonify({"status": "ok", "state": asdict(state)})
 
 @app.route("/clear-mode", methods=["POST"])
 def clear_mode():
     state = load_state()
-    state["active"] = False
-    state["mode"] = "normal"
-    state["reason"] = ""
-    state["expires"] = None
+    state.active = False
+    state.mode = "normal"
+    state.reason = ""
+    state.expires = None
     save_state(state)
-    return jsonify({"status": "ok"})
+    return jsonify({"status": "ok", "state": asdict(state)})
 
 @app.route("/status", methods=["GET"])
 def status():
     state = load_state()
-    state["active"] = is_mode_active()
-    save_state(state)
-    return jsonify(state)
+    active, changed = is_mode_active(state)
+    if changed:
+        save_state(state)
+    return jsonify(asdict(state))
 
 # ========================================
 # TEST AUDIO ROUTES
@@ -140,13 +197,22 @@ def play_audio():
 def incoming_call():
     r = VoiceResponse()
 
-    if is_mode_active():
-        st = load_state()
-        r.say(f"The user is currently in {st['mode']} mode. Please speak after the beep.")
+    # Twilio transcribes inline and posts SpeechResult to the action URL,
+    # so there is no recording to download or run through STT
+    g = Gather(input="speech", action="/process-recording", method="POST",
+               speech_timeout="auto", language="en-IN", action_on_empty_result=True)
+
+    st = load_state()
+    active, changed = is_mode_active(st)
+    if changed:
+        save_state(st)
+
+    if active:
+        g.say(f"The user is currently in {st.mode} mode. Please speak now.")
     else:
-        r.say("Hello! I am your AI assistant. Please speak after the beep.")
+        g.say("Hello! I am your AI assistant. Please speak now.")
 
-    r.record(action="/process-recording", method="POST", play_beep=True)
+    r.append(g)
     return Response(str(r), mimetype="text/xml")
 
 # ========================================
@@ -156,36 +222,17 @@ def incoming_call():
 def process_recording():
     st = load_state()
 
-    url = request.form.get("RecordingUrl") + ".wav"
-    audio_file = "caller.wav"
-
-    try:
-        data = requests.get(url).content
-        open(audio_file, "wb").write(data)
-    except:
-        r = VoiceResponse()
-        r.say("Sorry, error processing audio.")
-        r.hangup()
-        return Response(str(r), mimetype="text/xml")
-
-    # STT
-    rec = sr.Recognizer()
-    with sr.AudioFile(audio_file) as src:
-        audio = rec.record(src)
-    try:
-        text = rec.recognize_google(audio)
-    except:
-        text = ""
+    text = request.form.get("SpeechResult", "")
 
     # Urgency Check
     urgent = check_urgent(text)
 
     r = VoiceResponse()
 
-    if urgent and st["user_number"]:
+    if urgent and st.user_number:
         r.say("This seems urgent. Connecting you now.")
         d = Dial()
-        d.number(st["user_number"])
+        d.number(st.user_number)
         r.append(d)
         return Response(str(r), mimetype="text/xml")
 
@@ -196,95 +243,26 @@ def process_recording():
 # ========================================
 # URGENT DETECTOR
 # ========================================
+URGENT_WORDS = ("urgent", "important", "emergency", "immediately", "help", "asap")
+URGENT_RE = re.compile(r"\b(" + "|".join(URGENT_WORDS) + r")\b", re.IGNORECASE)
 def check_urgent(text):
-    text = (text or "").lower()
-    urgent_words = ["urgent", "important", "emergency", "immediately", "help"]
-    return any(w in text for w in urgent_words)
+    return bool(URGENT_RE.search(text or ""))
 
 # ========================================
 # MODE REPLY
 # ========================================
+MODE_REPLIES = {
+    "sleep": "The user is sleeping. I will notify them.",
+    "meeting": "The user is in a meeting.",
+    "driving": "The user is driving.",
+}
+DEFAULT_REPLY = "The user is not available."
+
 def mode_reply(st):
-    mode = st["mode"]
-    reason = st["reason"]
-
-    if mode == "sleep":
-        return "The user is sleeping. I will notify them."
-    if mode == "meeting":
-        return "The user is in a meeting."
-    if mode == "driving":
-        return "The user is driving."
+    mode = st.mode
     if mode == "custom":
-        return f"The user is unavailable: {reason}"
-
-    return "The user is not available."
-
-# ========================================
-# STREAMLIT FRONTEND
-# ========================================
-def run_ui():
-    import streamlit as st
-    import requests
-
-    st.set_page_config(page_title="Call.AI", layout="centered")
-    st.title("📞 Call.AI Mobile App")
-
-    menu = st.sidebar.selectbox("Menu", ["Welcome","Enter Number","Modes","Forwarding","Test Call"])
-
-    if menu == "Welcome":
-        st.header("Welcome to Call.AI")
-        st.write("This is your mobile-style UI for managing call forwarding + modes.")
-
-    if menu == "Enter Number":
-        st.header("Enter your phone number")
-        num = st.text_input("Phone Number (+91...)")
-        if st.button("Save"):
-            requests.post(f"{FLASK_BASE}/set-mode", json={
-                "mode":"normal","reason":"","duration":1,"user_number":num
-            })
-            requests.post(f"{FLASK_BASE}/clear-mode")
-            st.success("Saved!")
-
-    if menu == "Modes":
-        st.header("Select Mode")
-        mode = st.selectbox("Mode", ["sleep","meeting","driving","custom"])
-        reason = ""
-        if mode == "custom":
-            reason = st.text_input("Reason")
-        dur = st.slider("Duration (min)", 1, 60, 10)
-        if st.button("Activate"):
-            requests.post(f"{FLASK_BASE}/set-mode", json={
-                "mode":mode,"reason":reason,"duration":dur,
-                "user_number":load_state()["user_number"]
-            })
-            st.success("Mode ON")
-
-        if st.button("Clear"):
-            requests.post(f"{FLASK_BASE}/clear-mode")
-            st.success("Cleared")
-
-        st.json(requests.get(f"{FLASK_BASE}/status").json())
-
-    if menu == "Forwarding":
-        st.header("Activate Call Forwarding")
-        if AI_NUMBER:
-            code = f"**61*{AI_NUMBER}#"
-            st.write("Tap this button on mobile:")
-            st.markdown(f"[Open Dialer → {code}](tel:{code})")
-        else:
-            st.error("AI_NUMBER missing")
-
-    if menu == "Test Call":
-        st.header("Test AI Flow")
-        from twilio.rest import Client
-        client = Client(TW_SID, TW_TOKEN)
-
-        opt = st.selectbox("Caller Type", ["urgent audio","not urgent audio"])
-        file = "test_caller_urgent.wav" if opt=="urgent audio" else "test_caller_noturgent.wav"
-        if st.button("Start Test Call"):
-            url = f"{BASE_URL}/play-audio?file={file}"
-            call = client.calls.create(to=AI_NUMBER, from_=TW_FROM, url=url)
-            st.success(f"Call SID: {call.sid}")
+        return f"The user is unavailable: {st.reason}"
+    return MODE_REPLIES.get(mode, DEFAULT_REPLY)
 
 # ========================================
 # ENTRY POINT
@@ -292,13 +270,16 @@ def run_ui():
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         if sys.argv[1] == "ui":
-            run_ui()
+            # The UI lives in its own script so the backend never imports Streamlit
+            ui = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ui.py")
+            sys.exit(subprocess.call([sys.executable, "-m", "streamlit", "run", ui]))
         else:
             print("Unknown command.")
     else:
         print("Running backend... Use:")
         print("  python app.py ui    -> Streamlit UI")
         print("  python app.py       -> Backend")
+        print("  gunicorn -k gevent -w 1 --worker-connections 1000 app:app -> Production backend")
         app.run(port=5000)
 
 
@@ -0,0 +1,199 @@
+import os
+import time
+import random
+from urllib.parse import quote
+from dataclasses import dataclass
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import streamlit as st
+from dotenv import load_dotenv
+
+# ========================================
+# LOAD ENV (once per process, not per rerun)
+# ========================================
+@dataclass(frozen=True)
+class Config:
+    tw_sid: Optional[str]
+    tw_token: Optional[str]
+    tw_from: Optional[str]      # Twilio From Number
+    ai_number: Optional[str]    # AI Twilio Number
+    base_url: Optional[str]     # ngrok URL
+    flask_base: str
+
+@st.cache_resource
+def get_config():
+    load_dotenv()
+    return Config(
+        tw_sid=os.getenv("TWILIO_ACCOUNT_SID"),
+        tw_token=os.getenv("TWILIO_AUTH_TOKEN"),
+        tw_from=os.getenv("TWILIO_NUMBER"),
+        ai_number=os.getenv("TWILIO_AI_NUMBER"),
+        base_url=os.getenv("BASE_URL"),
+        flask_base=os.getenv("FLASK_BASE", "http://localhost:5000"),
+    )
+
+cfg = get_config()
+
+HTTP_TIMEOUT = (3.05, 10)      # (connect, read) seconds for backend calls
+TWILIO_TIMEOUT = 30           # seconds; Twilio's client only takes a single float
+
+# ========================================
+# HTTP SESSION (kept across Streamlit reruns)
+# ========================================
+@st.cache_resource
+def http_session():
+    s = requests.Session()
+    # Up to 3 attempts (2 retries). Backend writes are idempotent, so POSTs
+    # are safe to retry too. Read timeouts are not retried (read=0) so a hung
+    # backend costs one HTTP_TIMEOUT, and a final 429/5xx is returned rather
+    # than raised
+    retry = Retry(total=2, read=0, backoff_factor=0.5,
+                  status_forcelist=[429, 500, 502, 503, 529],
+                  allowed_methods=["GET", "POST"],
+                  respect_retry_after_header=True,
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retry)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+SESSION = http_session()
+
+# Widget changes rerun the whole script; don't refetch unchanged state
+@st.cache_data(ttl=2.0)
+def get_status():
+    r = SESSION.get(f"{cfg.flask_base}/status", timeout=HTTP_TIMEOUT)
+    return r.json() if r.ok else None
+
+@st.cache_resource
+def twilio_client():
+    from twilio.rest import Client
+    from twilio.http.http_client import TwilioHttpClient
+    return Client(cfg.tw_sid, cfg.tw_token, http_client=TwilioHttpClient(timeout=TWILIO_TIMEOUT))
+
+def play_url_for(filename):
+    # Encode the filename so Twilio fetches exactly the file we meant
+    return f"{cfg.base_url}/play-audio?file={quote(filename)}"
+
+def place_test_call(url, attempts=3):
+    from twilio.base.exceptions import TwilioRestException
+
+    for attempt in range(attempts):
+        try:
+            return twilio_client().calls.create(to=cfg.ai_number, from_=cfg.tw_from, url=url)
+        except TwilioRestException as e:
+            # Only 429 is known to have created no call; anything else could
+            # place a duplicate if retried
+            if e.status != 429 or attempt == attempts - 1:
+                raise
+            time.sleep(random.uniform(1, 2) * (attempt + 1))
+
+# ========================================
+# PAGES
+# Pages with widgets are fragments: interacting with them reruns only
+# that page, not the sidebar and the rest of the script
+# ========================================
+def welcome_page():
+    st.header("Welcome to Call.AI")
+    st.write("This is your mobile-style UI for managing call forwarding + modes.")
+
+@st.fragment
+def enter_number_page():
+    st.header("Enter your phone number")
+    num = st.text_input("Phone Number (+91...)")
+    if st.button("Save"):
+        try:
+            r = SESSION.post(f"{cfg.flask_base}/set-user-number", json={"user_number":num},
+                             timeout=HTTP_TIMEOUT)
+        except requests.RequestException as e:
+            st.error(f"Backend unreachable: {e}")
+            return
+        get_status.clear()
+        if r.ok:
+            st.success("Saved!")
+        else:
+            st.error(f"Could not save number ({r.status_code})")
+
+@st.fragment
+def modes_page():
+    st.header("Select Mode")
+    mode = st.selectbox("Mode", ["sleep","meeting","driving","custom"])
+    reason = ""
+    if mode == "custom":
+        reason = st.text_input("Reason")
+    dur = st.slider("Duration (min)", 1, 60, 10)
+    # Mode changes answer with the new state, so only fetch /status otherwise
+    status = None
+    try:
+        if st.button("Activate"):
+            r = SESSION.post(f"{cfg.flask_base}/set-mode", json={
+                "mode":mode,"reason":reason,"duration":dur
+            }, timeout=HTTP_TIMEOUT)
+            get_status.clear()
+            if r.ok:
+                status = r.json()["state"]
+                st.success("Mode ON")
+            else:
+                st.error(f"Could not set mode ({r.status_code})")
+
+        if st.button("Clear"):
+            r = SESSION.post(f"{cfg.flask_base}/clear-mode", timeout=HTTP_TIMEOUT)
+            get_status.clear()
+            if r.ok:
+                status = r.json()["state"]
+                st.success("Cleared")
+            else:
+                st.error(f"Could not clear mode ({r.status_code})")
+
+        st.json(status or get_status())
+    except requests.RequestException as e:
+        st.error(f"Backend unreachable: {e}")
+
+def forwarding_page():
+    st.header("Activate Call Forwarding")
+    if cfg.ai_number:
+        code = f"**61*{cfg.ai_number}#"
+        st.write("Tap this button on mobile:")
+        st.markdown(f"[Open Dialer → {code}](tel:{code})")
+    else:
+        st.error("AI_NUMBER missing")
+
+@st.fragment
+def test_call_page():
+    st.header("Test AI Flow")
+    opt = st.selectbox("Caller Type", ["urgent audio","not urgent audio"])
+    file = "test_caller_urgent.wav" if opt=="urgent audio" else "test_caller_noturgent.wav"
+    if st.button("Start Test Call"):
+        # Covers TwilioRestException (bad number, 401, exhausted 429) and
+        # missing credentials; imported here to keep the SDK lazy
+        from twilio.base.exceptions import TwilioException
+
+        try:
+            call = place_test_call(play_url_for(file))
+        except requests.RequestException as e:
+            st.error(f"Twilio unreachable: {e}")
+            return
+        except TwilioException as e:
+            st.error(f"Twilio error: {e}")
+            return
+        st.success(f"Call SID: {call.sid}")
+
+PAGES = {
+    "Welcome": welcome_page,
+    "Enter Number": enter_number_page,
+    "Modes": modes_page,
+    "Forwarding": forwarding_page,
+    "Test Call": test_call_page,
+}
+
+# ========================================
+# STREAMLIT FRONTEND
+# Run with: streamlit run ui.py
+# ========================================
+st.set_page_config(page_title="Call.AI", layout="centered")
+st.title("📞 Call.AI Mobile App")
+
+menu = st.sidebar.selectbox("Menu", list(PAGES))
+PAGES[menu]()